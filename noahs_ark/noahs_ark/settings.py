@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/1.11/ref/settings/
 """
 
 import os
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -83,6 +84,14 @@ DATABASES = {
 }
 
 
+# Throttling
+# Memory-mapped file holding the token buckets shared by this host's workers.
+
+THROTTLE_STORE_PATH = os.path.join(tempfile.gettempdir(), 'noahs_ark_throttle')
+
+THROTTLE_STORE_SLOTS = 65536
+
+
 # Password validation
 # https://docs.djangoproject.com/en/1.11/ref/settings/#auth-password-validators
 
@@ -125,3 +134,21 @@ STATIC_URL = '/static/'
 #media Locations
 MEDIA_URL = '/static/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'static/media/')
+
+
+# Django REST framework
+# http://www.django-rest-framework.org/api-guide/throttling/
+
+REST_FRAMEWORK = {
+    'DEFAULT_THROTTLE_RATES': {
+        'anon_read': '120/min',
+        'user_write': '30/min',
+        'bulk': '60/min',
+    },
+}
+
+
+# Startup profiling
+# Worker boot budget in milliseconds checked by `manage.py startup_profile`.
+
+STARTUP_TIME_BUDGET = 600
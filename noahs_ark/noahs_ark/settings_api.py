@@ -0,0 +1,55 @@
+"""
+Django settings for API-only noahs_ark worker nodes.
+
+Everything comes from noahs_ark.settings except the admin, sessions,
+messages and staticfiles apps and the middleware that goes with them, none
+of which the phone API uses. Leaving them out keeps worker boot fast.
+Clients authenticate with HTTP basic auth and get JSON back.
+
+Run a worker with DJANGO_SETTINGS_MODULE=noahs_ark.settings_api.
+"""
+
+from noahs_ark.settings import *  # pylint: disable=wildcard-import,unused-wildcard-import
+
+
+INSTALLED_APPS = [
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'phones.apps.PhonesConfig',
+    'rest_framework',
+]
+
+MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'django.middleware.common.CommonMiddleware',
+]
+
+ROOT_URLCONF = 'noahs_ark.urls_api'
+
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.debug',
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+            ],
+        },
+    },
+]
+
+REST_FRAMEWORK = dict(
+    REST_FRAMEWORK,
+    DEFAULT_AUTHENTICATION_CLASSES=(
+        'rest_framework.authentication.BasicAuthentication',
+    ),
+    DEFAULT_RENDERER_CLASSES=(
+        'rest_framework.renderers.JSONRenderer',
+    ),
+)
+
+# API-only workers load fewer apps, so hold them to a tighter budget.
+STARTUP_TIME_BUDGET = 500
@@ -0,0 +1,166 @@
+"""
+Measure how long a noahs_ark worker takes to boot.
+
+Run as `python -m noahs_ark.startup` in a fresh interpreter so that nothing
+is imported yet. It boots Django the way the WSGI handler does and prints a
+JSON report on stdout with:
+
+* imports: one entry per module imported during boot, with the time spent
+  executing the module itself and the cumulative time including the
+  modules it imported, like `python -X importtime` reports.
+* apps: for every installed app, the time spent importing its models and
+  running its AppConfig.ready().
+* phases: the time spent in django.setup(), building the WSGI handler
+  (loading middleware) and loading the root URLconf.
+* budget: STARTUP_TIME_BUDGET from the settings being profiled.
+
+Only the standard library is imported at module level so the numbers are
+not skewed by anything imported before profiling starts.
+"""
+
+import json
+import sys
+import time
+
+
+class _TimedLoader(object):
+    '''Loader wrapper timing how long a module takes to execute'''
+
+    def __init__(self, loader, timer):
+        self.loader = loader
+        self.timer = timer
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+    def create_module(self, spec):
+        '''Delegate module creation to the real loader'''
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        '''Execute the module with the real loader, timing it'''
+        # The module should only ever see its real loader.
+        module.__loader__ = module.__spec__.loader = self.loader
+        self.timer.enter(module.__name__)
+        try:
+            self.loader.exec_module(module)
+        finally:
+            self.timer.exit()
+
+
+class ImportTimer(object):
+    '''
+    Meta path finder recording self and cumulative import time per module.
+
+    It finds modules with the finders behind it on sys.meta_path and wraps
+    their loaders to time the module body.
+    '''
+
+    def __init__(self):
+        self.imports = []
+        self._stack = []
+
+    def find_spec(self, fullname, path, target=None):
+        '''Find the module with the other finders and time its loader'''
+        for finder in sys.meta_path:
+            if finder is self:
+                continue
+            if not hasattr(finder, 'find_spec'):
+                # Leave legacy finders to the import system, untimed.
+                return None
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+
+        if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+            spec.loader = _TimedLoader(spec.loader, self)
+        return spec
+
+    def enter(self, name):
+        '''Start timing a module'''
+        self._stack.append([name, time.perf_counter(), 0.0])
+
+    def exit(self):
+        '''Stop timing the current module and charge it to its importer'''
+        name, started, children = self._stack.pop()
+        cumulative = time.perf_counter() - started
+        if self._stack:
+            self._stack[-1][2] += cumulative
+        self.imports.append({
+            'module': name,
+            'self': cumulative - children,
+            'cumulative': cumulative,
+            'depth': len(self._stack),
+        })
+
+    def install(self):
+        '''Start recording imports'''
+        sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        '''Stop recording imports'''
+        sys.meta_path.remove(self)
+
+
+def _timed(func, timings, key):
+    '''Wrap func so each call adds its duration to timings[key]'''
+    def wrapper(*args, **kwargs):
+        '''Call func and record how long it took'''
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            timings[key] = timings.get(key, 0.0) + time.perf_counter() - started
+    return wrapper
+
+
+def profile_startup():
+    '''Boot Django in this interpreter and return the startup report'''
+    import_timer = ImportTimer()
+    import_timer.install()
+    phases = {}
+    apps = {}
+    try:
+        started = time.perf_counter()
+        from django.apps import AppConfig
+        import_models = AppConfig.import_models
+
+        def timed_import_models(app_config, *args, **kwargs):
+            '''Time importing the app's models, and its ready() later on'''
+            timings = apps.setdefault(app_config.name, {})
+            app_config.ready = _timed(app_config.ready, timings, 'ready')
+            return _timed(import_models, timings, 'models')(app_config, *args, **kwargs)
+
+        AppConfig.import_models = timed_import_models
+        try:
+            import django
+            django.setup(set_prefix=False)
+        finally:
+            AppConfig.import_models = import_models
+        phases['setup'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        from django.core.handlers.wsgi import WSGIHandler
+        WSGIHandler()
+        phases['wsgi'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        from django.urls import get_resolver
+        get_resolver().url_patterns  # pylint: disable=expression-not-assigned
+        phases['urls'] = time.perf_counter() - started
+    finally:
+        import_timer.uninstall()
+
+    from django.conf import settings
+    return {
+        'budget': settings.STARTUP_TIME_BUDGET,
+        'imports': import_timer.imports,
+        'apps': apps,
+        'phases': phases,
+    }
+
+
+if __name__ == '__main__':
+    json.dump(profile_startup(), sys.stdout)
@@ -0,0 +1,10 @@
+"""noahs_ark URL Configuration for API-only worker nodes
+
+Same as noahs_ark.urls without the admin and the browsable API login views,
+which need the apps that noahs_ark.settings_api leaves out.
+"""
+from django.conf.urls import url, include
+
+urlpatterns = [
+    url(r'^', include('phones.urls')),
+]
@@ -0,0 +1,67 @@
+'''Command reporting where worker boot time goes'''
+import json
+import os
+import subprocess
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    '''
+    Boot a worker in a fresh interpreter and report the import time per
+    module, the models import and ready() time per app and the time per boot
+    phase. Fails when the boot takes longer than the budget.
+    '''
+    help = 'Profile worker boot time and check it against the startup budget.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=20,
+                            help='Number of slowest imports to list.')
+        parser.add_argument('--budget', type=float, default=None,
+                            help='Boot time budget in milliseconds, defaults to '
+                                 'STARTUP_TIME_BUDGET of the profiled settings.')
+
+    def handle(self, *args, **options):
+        settings_module = options['settings'] or os.environ['DJANGO_SETTINGS_MODULE']
+        report = self.profile(settings_module)
+        budget = options['budget']
+        if budget is None:
+            budget = report['budget']
+
+        imports = sorted(report['imports'], key=lambda entry: entry['cumulative'],
+                         reverse=True)
+        self.stdout.write('Imports (%d slowest of %d, settings %s)' % (
+            min(options['limit'], len(imports)), len(imports), settings_module))
+        self.stdout.write('%12s %16s  %s' % ('self [ms]', 'cumulative [ms]', 'module'))
+        for entry in imports[:options['limit']]:
+            self.stdout.write('%12.1f %16.1f  %s%s' % (
+                entry['self'] * 1000, entry['cumulative'] * 1000,
+                '  ' * entry['depth'], entry['module']))
+
+        self.stdout.write('\nApps')
+        self.stdout.write('%12s %16s  %s' % ('models [ms]', 'ready [ms]', 'app'))
+        for name, timings in report['apps'].items():
+            self.stdout.write('%12.1f %16.1f  %s' % (
+                timings.get('models', 0) * 1000, timings.get('ready', 0) * 1000, name))
+
+        self.stdout.write('\nPhases')
+        for name in ('setup', 'wsgi', 'urls'):
+            self.stdout.write('%12.1f ms  %s' % (report['phases'][name] * 1000, name))
+        total = sum(report['phases'].values()) * 1000
+        self.stdout.write('%12.1f ms  total (budget %.0f ms)' % (total, budget))
+
+        if total > budget:
+            raise CommandError('Worker boot took %.1f ms, over the %.0f ms budget.'
+                               % (total, budget))
+
+    def profile(self, settings_module):
+        '''Run noahs_ark.startup in a fresh interpreter and return its report'''
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings_module)
+        child = subprocess.run([sys.executable, '-m', 'noahs_ark.startup'],
+                               cwd=settings.BASE_DIR, env=env,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               universal_newlines=True)
+        if child.returncode:
+            raise CommandError('Profiling %s failed:\n%s' % (settings_module, child.stderr))
+        return json.loads(child.stdout)
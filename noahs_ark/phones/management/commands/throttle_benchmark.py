@@ -0,0 +1,58 @@
+'''Command measuring the per request cost of throttling'''
+import os
+import tempfile
+import timeit
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from phones.throttling import BucketStore
+from phones.views import PhoneListView
+
+
+def benchmark_throttle(throttle_class, store):
+    '''
+    Return a subclass of throttle_class that never throttles and keeps its
+    buckets in store, under a key prefix of its own.
+    '''
+    return type('Benchmark' + throttle_class.__name__, (throttle_class,), {
+        'rate': '1000000/s',
+        'cache_format': 'benchmark_' + throttle_class.cache_format,
+        'store': store,
+    })
+
+
+class Command(BaseCommand):
+    '''
+    Time PhoneListView.check_throttles() for an anonymous GET, which runs
+    every throttle of the view, and each of those throttles on its own.
+    '''
+    help = 'Benchmark the per request cost of the token bucket throttles.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=10000,
+                            help='Number of checks per timing.')
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='Number of timings, the fastest is reported.')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            store = BucketStore(path=os.path.join(directory, 'throttle'), slots=64)
+            throttle_classes = tuple(benchmark_throttle(throttle_class, store)
+                                     for throttle_class in PhoneListView.throttle_classes)
+            view = PhoneListView(throttle_classes=throttle_classes)
+            django_request = RequestFactory().get('/category/1/phones/')
+            django_request.user = AnonymousUser()
+            request = view.initialize_request(django_request)
+
+            timings = [('PhoneListView.check_throttles()',
+                        lambda: view.check_throttles(request))]
+            for throttle_class in throttle_classes:
+                throttle = throttle_class()
+                timings.append((throttle_class.__name__[len('Benchmark'):],
+                                lambda throttle=throttle: throttle.allow_request(request, view)))
+
+            for name, check in timings:
+                seconds = min(timeit.repeat(check, number=options['runs'],
+                                            repeat=options['repeat']))
+                self.stdout.write('%10.2f us per request  %s'
+                                  % (seconds / options['runs'] * 1e6, name))
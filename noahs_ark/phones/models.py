@@ -1,5 +1,9 @@
 '''Model module for phones'''
-from django.db import models
+import datetime
+from collections import namedtuple
+from django.db import models, transaction, IntegrityError
+from django.db.models import Count, Max, Min, Sum
+from django.utils import timezone
 
 # Create your models here.
 
@@ -18,3 +22,194 @@ class Phones(models.Model):
     front_image = models.ImageField(upload_to="phonephotos/%Y/%m/%d", default="default.jpeg")
     back_image = models.ImageField(upload_to="phonephotos/%Y/%m/%d", default="default.jpeg")
     side_image = models.ImageField(upload_to="phonephotos/%Y/%m/%d", default="default.jpeg")
+
+
+PRICE_BUCKETS = (
+    ('day', 'Day'),
+    ('week', 'Week'),
+)
+
+BUCKET_LENGTHS = {
+    'day': datetime.timedelta(days=1),
+    'week': datetime.timedelta(days=7),
+}
+
+# The prices in effect for a phone or a category: their sum, how many there
+# are and the lowest and highest of them.
+PriceState = namedtuple('PriceState', ('total', 'count', 'low', 'high'))
+
+NO_PRICES = PriceState(0, 0, None, None)
+
+
+def with_price(state, price):
+    '''Return state with price added to it, unchanged if price is None'''
+    if price is None:
+        return state
+    return PriceState(state.total + price, state.count + 1,
+                      price if state.low is None else min(state.low, price),
+                      price if state.high is None else max(state.high, price))
+
+
+def category_price_state(category_id, exclude):
+    '''Return the prices in effect in a category, leaving out one phone'''
+    phones = Phones.objects.filter(phone_category=category_id).exclude(pk=exclude)
+    prices = phones.aggregate(total=Sum('price'), count=Count('pk'),
+                              low=Min('price'), high=Max('price'))
+    return PriceState(prices['total'] or 0, prices['count'], prices['low'], prices['high'])
+
+
+def bucket_start(bucket, day):
+    '''Return the first day of the day or week bucket holding day'''
+    if bucket == 'week':
+        return day - datetime.timedelta(days=day.weekday())
+    return day
+
+
+class PriceBucket(models.Model):
+    '''
+    Abstract model table for the prices in effect over a day or a week.
+
+    Besides the lowest and highest price, a bucket keeps the prices in effect
+    since its last change and their sum and count integrated over the
+    seconds up to that change, which give the time-weighted average price.
+    '''
+    bucket = models.CharField(max_length=4, choices=PRICE_BUCKETS)
+    start = models.DateField()
+    min_price = models.PositiveIntegerField(null=True)
+    max_price = models.PositiveIntegerField(null=True)
+    weighted_total = models.BigIntegerField()
+    weighted_count = models.BigIntegerField()
+    changed_at = models.DateTimeField()
+    close_total = models.BigIntegerField()
+    close_count = models.PositiveIntegerField()
+    close_min = models.PositiveIntegerField(null=True)
+    close_max = models.PositiveIntegerField(null=True)
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def opened(cls, state, **fields):
+        '''Return a new bucket that has held state since it started'''
+        price_bucket = cls(weighted_total=0, weighted_count=0, **fields)
+        price_bucket.changed_at = price_bucket.started_at
+        price_bucket.min_price, price_bucket.max_price = state.low, state.high
+        (price_bucket.close_total, price_bucket.close_count,
+         price_bucket.close_min, price_bucket.close_max) = state
+        return price_bucket
+
+    @classmethod
+    def apply(cls, before, after, when, **owner):
+        '''
+        Fold a change of the owner's prices from the before to the after
+        PriceState at when into its day and week buckets. A bucket opened by
+        the change starts out holding the before prices.
+        '''
+        for bucket, _ in PRICE_BUCKETS:
+            lookup = dict(owner, bucket=bucket, start=bucket_start(bucket, when.date()))
+            while True:
+                price_bucket = cls.objects.select_for_update().filter(**lookup).first()
+                created = price_bucket is None
+                if created:
+                    price_bucket = cls.opened(before, **lookup)
+                price_bucket.change(after, when)
+                try:
+                    with transaction.atomic():
+                        price_bucket.save(force_insert=created)
+                    break
+                except IntegrityError:
+                    # Another request opened the bucket first.
+                    continue
+
+    @property
+    def started_at(self):
+        '''Start of the bucket as a datetime'''
+        return datetime.datetime.combine(self.start, datetime.time(), tzinfo=timezone.utc)
+
+    @property
+    def ends_at(self):
+        '''End of the bucket as a datetime'''
+        return self.started_at + BUCKET_LENGTHS[self.bucket]
+
+    @property
+    def closing_state(self):
+        '''The prices in effect since the last change'''
+        return PriceState(self.close_total, self.close_count, self.close_min, self.close_max)
+
+    def change(self, state, when):
+        '''Hold the state prices from when onwards'''
+        seconds = int((when - self.changed_at).total_seconds())
+        self.weighted_total += self.close_total * seconds
+        self.weighted_count += self.close_count * seconds
+        (self.close_total, self.close_count,
+         self.close_min, self.close_max) = state
+        self.changed_at = when
+        period = with_price(with_price(state, self.min_price), self.max_price)
+        self.min_price, self.max_price = period.low, period.high
+
+    @property
+    def avg_price(self):
+        '''Time-weighted average of the prices in effect during the bucket'''
+        until = min(self.ends_at, timezone.now())
+        seconds = max(0, int((until - self.changed_at).total_seconds()))
+        count = self.weighted_count + self.close_count * seconds
+        if count:
+            return (self.weighted_total + self.close_total * seconds) / count
+        if self.close_count:
+            return self.close_total / self.close_count
+        return None
+
+
+class PhonePriceBucket(PriceBucket):
+    '''Model table for the prices a phone had over a day or a week'''
+    phone = models.ForeignKey(Phones, on_delete=models.CASCADE)
+
+    class Meta:
+        unique_together = ('phone', 'bucket', 'start')
+
+
+class CategoryPriceBucket(PriceBucket):
+    '''Model table for the prices of every phone in a category over a day or a week'''
+    phone_category = models.ForeignKey(PhoneCategory, on_delete=models.CASCADE)
+
+    class Meta:
+        unique_together = ('phone_category', 'bucket', 'start')
+
+
+class PriceHistoryManager(models.Manager):
+    '''Manager recording phone prices'''
+
+    def record(self, phone, before, after, when=None):
+        '''
+        Record a phone going from before to after, each a
+        (phone_category_id, price) pair or None while the phone does not
+        exist. A new price is appended to the history and folded into the
+        phone's aggregates, and the aggregates of the categories the phone
+        left or joined are updated from every phone in them.
+        '''
+        when = when or timezone.now()
+        entry = None
+        with transaction.atomic():
+            if after is not None and (before is None or before[1] != after[1]):
+                entry = self.create(phone=phone, price=after[1], changed_at=when)
+                PhonePriceBucket.apply(with_price(NO_PRICES, before and before[1]),
+                                       with_price(NO_PRICES, after[1]), when, phone=phone)
+            for category_id in {pair[0] for pair in (before, after) if pair is not None}:
+                others = category_price_state(category_id, exclude=phone.pk)
+                CategoryPriceBucket.apply(
+                    with_price(others, before[1] if before and before[0] == category_id else None),
+                    with_price(others, after[1] if after and after[0] == category_id else None),
+                    when, phone_category_id=category_id)
+        return entry
+
+
+class PriceHistory(models.Model):
+    '''Append-only model table of the prices a phone has had.'''
+    phone = models.ForeignKey(Phones, on_delete=models.CASCADE)
+    price = models.PositiveIntegerField()
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    objects = PriceHistoryManager()
+
+    class Meta:
+        index_together = ('phone', 'changed_at')
@@ -29,3 +29,11 @@ class PhoneSerializer(serializers.ModelSerializer):
         model = Phones
         fields = ('phone_name', 'id', 'phone_category', 'price', 'photo',
                   'details', 'front_image', 'side_image', 'back_image')
+
+
+class PriceBucketSerializer(serializers.Serializer):
+    '''Class Serializer for day or week price aggregates'''
+    start = serializers.DateField(read_only=True)
+    min_price = serializers.IntegerField(read_only=True)
+    max_price = serializers.IntegerField(read_only=True)
+    avg_price = serializers.FloatField(read_only=True)
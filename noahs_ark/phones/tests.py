@@ -1,9 +1,23 @@
 '''Test file for the phone app'''
+import datetime
 import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+from django.db import DatabaseError
+from django.utils import timezone
+from django.core.management import call_command, CommandError
 from django.test import TestCase
 from django.contrib.auth.models import User
-from phones.models import PhoneCategory, Phones
+from phones.models import PhoneCategory, Phones, PriceHistory, PhonePriceBucket, PriceState
 from phones.serializers import PhoneCategorySerializer, PhoneSerializer
+from phones.throttling import (BucketStore, bucket_store, TokenBucketThrottle, AnonReadThrottle,
+                               UserWriteThrottle, BulkReadThrottle)
+
+def at(year, month, day, hour=0):
+    '''Return an aware UTC datetime'''
+    return datetime.datetime(year, month, day, hour, tzinfo=timezone.utc)
 
 class PhoneCategoryTestCase(TestCase):
     '''
@@ -145,6 +159,7 @@ class PhoneViewTestCase(TestCase):
     '''
     def setUp(self):
         '''Creating a user who logins for testing'''
+        bucket_store.clear()
         self.alice = User(username="alice", email="alice@example.org")
         self.alice.set_password("password")
         self.alice.save()
@@ -333,3 +348,248 @@ class PhoneViewTestCase(TestCase):
         self.assertEqual(phone_name_update.status_code, 403)
         phone_delete = self.client.delete("/category/1/phones/1/")
         self.assertEqual(phone_delete.status_code, 403)
+
+class ThrottleTestCase(TestCase):
+    '''
+    Test the token bucket throttles on the phone category and phone views
+    '''
+    def setUp(self):
+        '''Creating a user who logins for testing'''
+        bucket_store.clear()
+        self.alice = User(username="alice", email="alice@example.org")
+        self.alice.set_password("password")
+        self.alice.save()
+        self.phone_category = PhoneCategory.objects.create(name="Samsung")
+
+    def test_anon_reads_throttled(self):
+        '''Test that anonymous reads past the burst are refused with a Retry-After'''
+        with mock.patch.object(AnonReadThrottle, 'rate', '2/min', create=True):
+            self.assertEqual(self.client.get("/category/1/").status_code, 200)
+            self.assertEqual(self.client.get("/category/1/").status_code, 200)
+            response = self.client.get("/category/1/")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+
+    def test_bucket_refills(self):
+        '''Test that a throttled client is let back in once a token refills'''
+        timer = mock.Mock(return_value=1000.0)
+        with mock.patch.object(AnonReadThrottle, 'rate', '1/min', create=True), \
+                mock.patch.object(TokenBucketThrottle, 'timer', timer):
+            self.assertEqual(self.client.get("/category/1/").status_code, 200)
+            self.assertEqual(self.client.get("/category/1/").status_code, 429)
+            timer.return_value = 1059.0
+            self.assertEqual(self.client.get("/category/1/").status_code, 429)
+            timer.return_value = 1060.0
+            self.assertEqual(self.client.get("/category/1/").status_code, 200)
+
+    def test_user_writes_throttled(self):
+        '''Test that writes are throttled per user and reads are not counted'''
+        self.client.login(username="alice", password="password")
+        with mock.patch.object(UserWriteThrottle, 'rate', '1/min', create=True):
+            self.assertEqual(self.client.get("/category/1/").status_code, 200)
+            data = json.dumps(dict(name="Paa"))
+            first_update = self.client.put("/category/1/", data=data,
+                                           content_type='application/json')
+            second_update = self.client.put("/category/1/", data=data,
+                                            content_type='application/json')
+        self.assertEqual(first_update.status_code, 200)
+        self.assertEqual(second_update.status_code, 429)
+        self.assertIn('Retry-After', second_update)
+
+    def test_bulk_reads_throttled(self):
+        '''Test that listing phones is throttled for logged in users too'''
+        self.client.login(username="alice", password="password")
+        with mock.patch.object(BulkReadThrottle, 'rate', '1/min', create=True):
+            self.assertEqual(self.client.get("/category/1/phones/").status_code, 200)
+            self.assertEqual(self.client.get("/category/1/phones/").status_code, 429)
+            self.assertEqual(self.client.get("/category/1/").status_code, 200)
+
+    def test_store_shared_between_processes(self):
+        '''Test that separately mapped stores on one file share their buckets'''
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'throttle')
+            worker_1 = BucketStore(path=path, slots=64)
+            worker_2 = BucketStore(path=path, slots=64)
+            self.assertEqual(worker_1.spend('client', 2, 1.0, 1000.0), 0)
+            self.assertEqual(worker_2.spend('client', 2, 1.0, 1000.0), 0)
+            self.assertEqual(worker_1.spend('client', 2, 1.0, 1000.0), 1.0)
+            self.assertEqual(worker_2.spend('other', 2, 1.0, 1000.0), 0)
+
+    def test_throttle_benchmark(self):
+        '''Test that the benchmark reports the per request cost of throttling'''
+        out = StringIO()
+        call_command('throttle_benchmark', runs=10, repeat=1, stdout=out)
+        report = out.getvalue()
+        self.assertIn('us per request  PhoneListView.check_throttles()', report)
+        self.assertIn('us per request  BulkReadThrottle', report)
+
+class StartupProfileTestCase(TestCase):
+    '''
+    Test the startup_profile command and the API-only settings profile
+    '''
+    def test_startup_profile(self):
+        '''Test that imports, apps and boot phases are reported'''
+        out = StringIO()
+        call_command('startup_profile', limit=5, budget=60000, stdout=out)
+        report = out.getvalue()
+        self.assertIn('django.contrib.admin', report)
+        self.assertIn('phones', report)
+        self.assertIn('total (budget 60000 ms)', report)
+
+    def test_api_settings_profile(self):
+        '''Test that API-only workers boot without the admin and sessions apps'''
+        out = StringIO()
+        call_command('startup_profile', settings='noahs_ark.settings_api',
+                     budget=60000, stdout=out)
+        report = out.getvalue()
+        self.assertIn('rest_framework', report)
+        self.assertNotIn('django.contrib.admin', report)
+        self.assertNotIn('django.contrib.sessions', report)
+
+    def test_startup_budget_from_profiled_settings(self):
+        '''Test that the budget defaults to the one of the profiled settings'''
+        out = StringIO()
+        try:
+            call_command('startup_profile', settings='noahs_ark.settings_api', stdout=out)
+        except CommandError:
+            pass
+        self.assertIn('(budget 500 ms)', out.getvalue())
+
+    def test_startup_budget_exceeded(self):
+        '''Test that a boot slower than the budget fails the command'''
+        with self.assertRaises(CommandError):
+            call_command('startup_profile', budget=0, stdout=StringIO())
+
+class PriceHistoryTestCase(TestCase):
+    '''
+    Test the price history of phones and its day and week aggregates
+    '''
+    def setUp(self):
+        '''Creating a user who logins for testing and a phone to price'''
+        bucket_store.clear()
+        self.alice = User(username="alice", email="alice@example.org")
+        self.alice.set_password("password")
+        self.alice.save()
+        self.phone_category = PhoneCategory.objects.create(name="Samsung")
+        self.phone = Phones.objects.create(phone_name="Samsung S7",
+                                           phone_category=self.phone_category,
+                                           price=20000)
+
+    def put_price(self, price):
+        '''Update the phone's price through the API'''
+        data = dict(phone_name="Samsung S7", phone_category=self.phone_category.pk,
+                    price=price)
+        return self.client.put("/category/1/phones/1/", data=json.dumps(data),
+                               content_type='application/json')
+
+    def history(self, url, now):
+        '''Return (start, min, max, avg) of each bucket on a price-history url'''
+        with mock.patch('django.utils.timezone.now', return_value=now):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [(bucket['start'], bucket['min_price'], bucket['max_price'], bucket['avg_price'])
+                for bucket in response.data]
+
+    def test_price_change_mid_week(self):
+        '''Test that buckets hold the prices in effect, not only the changes'''
+        record = PriceHistory.objects.record
+        category = self.phone_category.pk
+        record(self.phone, None, (category, 100), when=at(2017, 1, 2))
+        record(self.phone, (category, 100), (category, 200), when=at(2017, 1, 4, 12))
+        self.assertEqual(PriceHistory.objects.count(), 2)
+        days = self.history("/category/1/phones/1/price-history/"
+                            "?bucket=day&since=2017-01-03&until=2017-01-05", at(2017, 2, 1))
+        self.assertEqual(days, [('2017-01-03', 100, 100, 100),
+                                ('2017-01-04', 100, 200, 150),
+                                ('2017-01-05', 200, 200, 200)])
+        weeks = self.history("/category/1/phones/1/price-history/?bucket=week&until=2017-01-09",
+                             at(2017, 2, 1))
+        self.assertEqual(weeks, [('2017-01-02', 100, 200, (100 * 2.5 + 200 * 4.5) / 7),
+                                 ('2017-01-09', 200, 200, 200)])
+
+    def test_category_of_several_phones(self):
+        '''Test that category buckets cover every phone in the category'''
+        record = PriceHistory.objects.record
+        category = self.phone_category.pk
+        other = Phones.objects.create(phone_name="Samsung S8",
+                                      phone_category=self.phone_category, price=300)
+        record(self.phone, None, (category, 100), when=at(2017, 1, 2))
+        self.phone.price = 100
+        self.phone.save()
+        record(other, None, (category, 300), when=at(2017, 1, 2))
+        record(self.phone, (category, 100), (category, 200), when=at(2017, 1, 4, 12))
+        self.phone.price = 200
+        self.phone.save()
+        record(other, (category, 300), None, when=at(2017, 1, 5, 6))
+        other.delete()
+        days = self.history("/category/1/price-history/?since=2017-01-02&until=2017-01-06",
+                            at(2017, 2, 1))
+        self.assertEqual(days, [('2017-01-02', 100, 300, 200),
+                                ('2017-01-03', 100, 300, 200),
+                                ('2017-01-04', 100, 300, (400 * 12 + 500 * 12) / 48),
+                                ('2017-01-05', 200, 300, (500 * 6 + 200 * 18) / 30),
+                                ('2017-01-06', 200, 200, 200)])
+
+    def test_put_records_price_changes(self):
+        '''Test that only price changes made through the API are recorded'''
+        self.client.login(username="alice", password="password")
+        self.assertEqual(self.put_price(20000).status_code, 200)
+        self.assertEqual(PriceHistory.objects.count(), 0)
+        self.assertEqual(self.put_price(25000).status_code, 200)
+        self.assertEqual(list(PriceHistory.objects.values_list('price', flat=True)), [25000])
+
+    def test_price_kept_when_history_fails(self):
+        '''Test that a price change is rolled back if its history is not written'''
+        self.client.login(username="alice", password="password")
+        with mock.patch.object(PriceHistory.objects, 'record', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.put_price(25000)
+        self.assertEqual(Phones.objects.get(pk=1).price, 20000)
+        self.assertEqual(PriceHistory.objects.count(), 0)
+
+    def test_post_records_price(self):
+        '''Test that a new phone's price starts its history'''
+        self.client.login(username="alice", password="password")
+        phone_post = self.client.post("/category/1/phones/",
+                                      {'phone_name': 'Samsung S8',
+                                       'phone_category': self.phone_category.pk,
+                                       'price': 30000
+                                      }
+                                     )
+        self.assertEqual(phone_post.status_code, 201)
+        self.assertEqual(PriceHistory.objects.get().price, 30000)
+
+    def test_price_history_view(self):
+        '''Test that price changes made through the API reach the aggregates'''
+        self.client.login(username="alice", password="password")
+        with mock.patch('django.utils.timezone.now', return_value=at(2017, 1, 4, 12)):
+            self.put_price(10000)
+        with mock.patch('django.utils.timezone.now', return_value=at(2017, 1, 4, 18)):
+            self.put_price(30000)
+        days = self.history("/category/1/phones/1/price-history/?bucket=day",
+                            at(2017, 1, 5))
+        self.assertEqual(days, [('2017-01-04', 10000, 30000, 20000),
+                                ('2017-01-05', 30000, 30000, 30000)])
+        weeks = self.history("/category/1/price-history/?bucket=week", at(2017, 1, 5))
+        self.assertEqual(weeks, [('2017-01-02', 10000, 30000, 20000)])
+
+    def test_price_history_range(self):
+        '''Test that the since and until parameters bound the buckets'''
+        for start in (datetime.date(2017, 1, 1), datetime.date(2017, 1, 2)):
+            PhonePriceBucket.opened(PriceState(1, 1, 1, 1), phone=self.phone,
+                                    bucket='day', start=start).save()
+        response = self.client.get("/category/1/phones/1/price-history/"
+                                   "?since=2017-01-02&until=2017-01-02")
+        self.assertEqual([bucket['start'] for bucket in response.data], ['2017-01-02'])
+
+    def test_price_history_invalid(self):
+        '''Test that unknown buckets, bad dates and phones are refused'''
+        response = self.client.get("/category/1/phones/1/price-history/?bucket=year")
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get("/category/1/phones/1/price-history/?since=yesterday")
+        self.assertEqual(response.status_code, 400)
+        PhoneCategory.objects.create(name="Iphone")
+        response = self.client.get("/category/2/phones/1/price-history/")
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get("/category/3/price-history/")
+        self.assertEqual(response.status_code, 404)
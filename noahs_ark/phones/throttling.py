@@ -0,0 +1,155 @@
+'''Throttling module for the phone app'''
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+from django.conf import settings
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class BucketStore(object):
+    '''
+    Token buckets in a memory-mapped file shared by the worker processes of
+    a host.
+
+    The file is a fixed table of slots and a key hashes straight to its
+    slot, so a lookup is O(1). Each slot holds a fingerprint of its key and
+    the bucket's (tokens, timestamp), and is locked while a token is spent.
+    Two keys hashing to the same slot reset each other's bucket.
+    '''
+    slot = struct.Struct('=8sdd')
+
+    def __init__(self, path=None, slots=None):
+        self.path = path
+        self.slots = slots
+        self._fd = None
+        self._map = None
+
+    def _open(self):
+        '''Map the store file, creating it on first use'''
+        self.path = self.path or settings.THROTTLE_STORE_PATH
+        self.slots = self.slots or settings.THROTTLE_STORE_SLOTS
+        size = self.slots * self.slot.size
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+
+    def spend(self, key, capacity, refill_rate, now):
+        '''
+        Spend a token from the key's bucket. Return 0 on success, or the
+        seconds until the bucket holds a token again.
+        '''
+        if self._map is None:
+            self._open()
+        digest = hashlib.md5(key.encode()).digest()
+        fingerprint = digest[8:]
+        offset = int.from_bytes(digest[:8], 'little') % self.slots * self.slot.size
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, self.slot.size, offset)
+        try:
+            stored, tokens, last_seen = self.slot.unpack_from(self._map, offset)
+            if stored != fingerprint:
+                tokens, last_seen = capacity, now
+            tokens = min(capacity, tokens + max(0, now - last_seen) * refill_rate)
+            if tokens < 1:
+                return (1 - tokens) / refill_rate
+            self.slot.pack_into(self._map, offset, fingerprint, tokens - 1, now)
+            return 0
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, self.slot.size, offset)
+
+    def clear(self):
+        '''Empty every bucket'''
+        if self._map is None:
+            self._open()
+        fcntl.lockf(self._fd, fcntl.LOCK_EX)
+        try:
+            self._map[:] = bytes(len(self._map))
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+
+bucket_store = BucketStore()
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    '''
+    Throttle requests with a token bucket.
+
+    Every client gets a bucket holding up to `num_requests` tokens which
+    refills at `num_requests / duration` tokens a second, and each request
+    spends one token. Clients may burst up to the full rate and are then held
+    to the average rate. Buckets are kept in the host's BucketStore.
+    '''
+    store = bucket_store
+
+    def allow_request(self, request, view):
+        '''Spend a token from the client's bucket if one is available'''
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.retry_after = self.store.spend(self.key, self.num_requests,
+                                            self.num_requests / float(self.duration),
+                                            self.timer())
+        return not self.retry_after
+
+    def wait(self):
+        '''Return the seconds until the bucket holds a token again'''
+        return self.retry_after
+
+
+class AnonReadThrottle(TokenBucketThrottle):
+    '''Throttle reads made by anonymous clients, keyed on their IP address'''
+    scope = 'anon_read'
+
+    def get_cache_key(self, request, view):
+        if request.user.is_authenticated or request.method not in SAFE_METHODS:
+            return None
+
+        return self.cache_format % {
+            'scope': self.scope,
+            'ident': self.get_ident(request)
+        }
+
+
+class UserWriteThrottle(TokenBucketThrottle):
+    '''Throttle writes made by authenticated users, keyed on their user id'''
+    scope = 'user_write'
+
+    def get_cache_key(self, request, view):
+        if not request.user.is_authenticated or request.method in SAFE_METHODS:
+            return None
+
+        return self.cache_format % {
+            'scope': self.scope,
+            'ident': request.user.pk
+        }
+
+
+class BulkReadThrottle(TokenBucketThrottle):
+    '''
+    Throttle reads of whole collections, which cost far more than reading a
+    single object. Users are keyed on their id and anonymous clients on
+    their IP address.
+    '''
+    scope = 'bulk'
+
+    def get_cache_key(self, request, view):
+        if request.method not in SAFE_METHODS:
+            return None
+
+        if request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+
+        return self.cache_format % {
+            'scope': self.scope,
+            'ident': ident
+        }
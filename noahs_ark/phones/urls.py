@@ -13,6 +13,12 @@ urlpatterns = [
     url(r'^category/(?P<pk>[0-9]+)/phones/(?P<pk2>[0-9]+)/$',
         views.PhoneDetailView.as_view(),
         name='phones-detail'),
+    url(r'^category/(?P<pk>[0-9]+)/price-history/$',
+        views.CategoryPriceHistoryView.as_view(),
+        name='phonecategory-price-history'),
+    url(r'^category/(?P<pk>[0-9]+)/phones/(?P<pk2>[0-9]+)/price-history/$',
+        views.PhonePriceHistoryView.as_view(),
+        name='phones-price-history'),
 ]
 
 urlpatterns = format_suffix_patterns(urlpatterns)
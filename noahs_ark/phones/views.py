@@ -1,11 +1,17 @@
 """Module for phone category and phone views"""
+from django.db import transaction
 from django.http import Http404
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from rest_framework import status, permissions, generics
 from rest_framework.decorators import api_view
+from rest_framework.exceptions import ValidationError
 from rest_framework.reverse import reverse
 from rest_framework.response import Response
-from phones.models import PhoneCategory, Phones
-from phones.serializers import PhoneCategorySerializer, PhoneSerializer
+from phones.models import (PhoneCategory, Phones, PriceHistory, PhonePriceBucket,
+                           CategoryPriceBucket, PRICE_BUCKETS, BUCKET_LENGTHS, bucket_start)
+from phones.serializers import PhoneCategorySerializer, PhoneSerializer, PriceBucketSerializer
+from phones.throttling import AnonReadThrottle, UserWriteThrottle, BulkReadThrottle
 
 # Create your views here.
 
@@ -16,6 +22,7 @@ class PhoneCategoryView(generics.ListCreateAPIView):
     queryset = PhoneCategory.objects.all()
     serializer_class = PhoneCategorySerializer
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
+    throttle_classes = (AnonReadThrottle, UserWriteThrottle, BulkReadThrottle)
 
 class PhoneCategoryDetailView(generics.RetrieveUpdateDestroyAPIView):
     """
@@ -24,6 +31,7 @@ class PhoneCategoryDetailView(generics.RetrieveUpdateDestroyAPIView):
     queryset = PhoneCategory.objects.all()
     serializer_class = PhoneCategorySerializer
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
+    throttle_classes = (AnonReadThrottle, UserWriteThrottle)
 
 
 class PhoneListView(generics.ListCreateAPIView):
@@ -33,6 +41,7 @@ class PhoneListView(generics.ListCreateAPIView):
     queryset = Phones.objects.all()
     serializer_class = PhoneSerializer
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
+    throttle_classes = (AnonReadThrottle, UserWriteThrottle, BulkReadThrottle)
     def check_object(self, pk):
         '''Check that the phone category exists'''
         try:
@@ -52,7 +61,9 @@ class PhoneListView(generics.ListCreateAPIView):
         self.check_object(pk)
         serializer = PhoneSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                phone = serializer.save()
+                PriceHistory.objects.record(phone, None, (phone.phone_category_id, phone.price))
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -66,6 +77,7 @@ class PhoneDetailView(generics.RetrieveUpdateDestroyAPIView):
     queryset = Phones.objects.filter()
     serializer_class = PhoneSerializer
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
+    throttle_classes = (AnonReadThrottle, UserWriteThrottle)
 
     def get_object(self, pk2):
         '''Return chosen phone object'''
@@ -83,18 +95,112 @@ class PhoneDetailView(generics.RetrieveUpdateDestroyAPIView):
     def put(self, request, *args, **kwargs):
         '''Update phone object data'''
         phone = self.get_object(kwargs['pk2'])
+        before = (phone.phone_category_id, phone.price)
         serializer = PhoneSerializer(phone, data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                serializer.save()
+                after = (phone.phone_category_id, phone.price)
+                if after != before:
+                    PriceHistory.objects.record(phone, before, after)
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def delete(self, request, *args, **kwargs):
         '''Delete phone object'''
         phone = self.get_object(kwargs['pk2'])
-        phone.delete()
+        with transaction.atomic():
+            PriceHistory.objects.record(phone, (phone.phone_category_id, phone.price), None)
+            phone.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+class PriceHistoryView(generics.ListAPIView):
+    """
+    Base view for day or week price aggregates, filtered with the `bucket`,
+    `since` and `until` query parameters.
+    """
+    serializer_class = PriceBucketSerializer
+    permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
+    throttle_classes = (AnonReadThrottle, BulkReadThrottle)
+
+    def get_date(self, param):
+        '''Return the date in a query parameter, None if it is not given'''
+        value = self.request.query_params.get(param)
+        if value is None:
+            return None
+        try:
+            day = parse_date(value)
+        except ValueError:
+            day = None
+        if day is None:
+            raise ValidationError({param: ['Enter a valid date as YYYY-MM-DD.']})
+        return day
+
+    def filter_queryset(self, queryset):
+        '''
+        Keep the requested bucket size and date range, in date order. Days or
+        weeks without a price change have no bucket stored, so they are filled
+        in with the prices carried over from the bucket before them.
+        '''
+        bucket = self.request.query_params.get('bucket', 'day')
+        choices = [choice for choice, _ in PRICE_BUCKETS]
+        if bucket not in choices:
+            raise ValidationError({'bucket': ['Choose one of: %s.' % ', '.join(choices)]})
+        since, until = self.get_date('since'), self.get_date('until')
+        today = bucket_start(bucket, timezone.now().date())
+        until = today if until is None else min(bucket_start(bucket, until), today)
+
+        queryset = queryset.filter(bucket=bucket)
+        stored = queryset.filter(start__lte=until)
+        previous = None
+        if since is not None:
+            since = bucket_start(bucket, since)
+            stored = stored.filter(start__gte=since)
+            previous = queryset.filter(start__lt=since).order_by('-start').first()
+        stored = {price_bucket.start: price_bucket for price_bucket in stored}
+        if previous is None:
+            if not stored:
+                return []
+            since = min(stored)
+
+        price_buckets = []
+        start = since
+        while start <= until:
+            price_bucket = stored.get(start)
+            if price_bucket is None and previous is not None and previous.close_count:
+                price_bucket = type(previous).opened(previous.closing_state,
+                                                     bucket=bucket, start=start)
+            if price_bucket is not None:
+                price_buckets.append(price_bucket)
+                previous = price_bucket
+            start += BUCKET_LENGTHS[bucket]
+        return price_buckets
+
+
+class PhonePriceHistoryView(PriceHistoryView):
+    """
+    Price aggregates for a particular phone
+    """
+
+    def get_queryset(self):
+        '''Return the phone's aggregates'''
+        pk, pk2 = self.kwargs['pk'], self.kwargs['pk2']
+        if not Phones.objects.filter(pk=pk2, phone_category=pk).exists():
+            raise Http404
+        return PhonePriceBucket.objects.filter(phone=pk2)
+
+
+class CategoryPriceHistoryView(PriceHistoryView):
+    """
+    Price aggregates for all phones in a phone category
+    """
+
+    def get_queryset(self):
+        '''Return the phone category's aggregates'''
+        if not PhoneCategory.objects.filter(pk=self.kwargs['pk']).exists():
+            raise Http404
+        return CategoryPriceBucket.objects.filter(phone_category=self.kwargs['pk'])
+
 @api_view(['GET'])
 def api_root(request, format=None):
     '''View for the root'''